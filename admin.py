@@ -35,7 +35,6 @@ from lib.err import (
     err_configured,
     err_unauthorized,
     err_max_stake_exceeded,
-    err_noderunner_fees_not_zero,
     err_chadm_txn_type,
     err_chadm_app_id,
     err_chadm_app_arg,
@@ -43,13 +42,38 @@ from lib.err import (
     err_chadm_not_called_by_new_admin,
     err_tm2_pool,
     err_arc59_hash,
+    err_migrated,
+    err_opup_max,
+    err_swap_policy,
+    err_swap_slippage,
+    err_swap_chunk,
+    err_swap_rounds,
+    err_config_field,
+)
+from lib.rate import (
+    get_actual_expected_balance_delta,
+    invalidate_swap_check,
+    max_swap_min_rounds,
+    pre_mint_or_redeem,
+    settle_rewards,
+)
+from lib.storage import (
+    cget,
+    config_pack,
+    cset,
+    gget,
+    gset,
+    legacy_config_fields,
+    tunable_fields,
+    tunable_index,
+    tunables_empty,
+    tunables_set,
 )
-from lib.rate import pre_mint_or_redeem
-from lib.storage import gget, gset
 from lib.str import (
     str_admin_addr,
     str_arc59_app_id,
     str_asa_id,
+    str_config,
     str_delay_optin,
     str_fee_addr,
     str_fee_update_max_delta,
@@ -61,12 +85,21 @@ from lib.str import (
     str_noderunner_addr,
     str_noderunner_fee_bps,
     str_noderunner_fees,
+    str_opup_max_fees,
     str_platform_fee_bps,
     str_rate_precision,
+    str_swap_keeper_bps,
+    str_swap_max_chunk_bps,
+    str_swap_max_slippage_bps,
+    str_swap_min_rounds,
+    str_swap_ref_price,
+    str_swap_min_surplus,
     str_tm2_app_id,
+    str_tunables,
     str_upgrade_period,
+    str_version,
 )
-from lib.utils import create_lst_asset, custom_assert, send_asa
+from lib.utils import create_lst_asset, custom_assert, send_algo, send_asa
 from router import router
 
 
@@ -98,22 +131,29 @@ def configure(
     asset2_id = App.localGetEx(lp_id.get(), tm2_app_id.get(), Bytes("asset_2_id"))
     return Seq(
         custom_assert(gget(str_lst_id) == Int(0), err_configured),
-        gset(str_asa_id, asa_id.get()),
         gset(str_lp_type, lp_type.get()),
         gset(str_lp_id, lp_id.get()),
-        gset(str_platform_fee_bps, platform_fee_bps.get()),
-        gset(str_noderunner_fee_bps, noderunner_fee_bps.get()),
         gset(str_admin_addr, admin_addr.get()),
         gset(str_fee_addr, fee_admin_addr.get()),
         gset(str_noderunner_addr, noderunner_addr.get()),
-        gset(str_delay_optin, delay_optin.get()),
-        gset(str_upgrade_period, upgrade_period.get()),
-        gset(str_fee_update_period, fee_update_period.get()),
-        gset(str_fee_update_max_delta, fee_update_max_delta.get()),
-        gset(str_max_balance, max_balance.get()),
-        gset(str_rate_precision, rate_precision.get()),
-        gset(str_tm2_app_id, tm2_app_id.get()),
-        gset(str_arc59_app_id, arc59_app_id.get()),
+        gset(
+            str_config,
+            config_pack([
+                (str_asa_id, asa_id.get()),
+                (str_tm2_app_id, tm2_app_id.get()),
+                (str_arc59_app_id, arc59_app_id.get()),
+                (str_rate_precision, rate_precision.get()),
+                (str_platform_fee_bps, platform_fee_bps.get()),
+                (str_noderunner_fee_bps, noderunner_fee_bps.get()),
+                (str_upgrade_period, upgrade_period.get()),
+                (str_fee_update_period, fee_update_period.get()),
+                (str_fee_update_max_delta, fee_update_max_delta.get()),
+                (str_max_balance, max_balance.get()),
+                (str_delay_optin, delay_optin.get()),
+                # no keeper bounty, see queue_update_fees
+                (str_swap_keeper_bps, Int(0)),
+            ]),
+        ),
         # opt in to ASA ID if not deferring
         If(Not(delay_optin.get())).Then(
             send_asa(
@@ -141,6 +181,35 @@ def configure(
         , err_arc59_hash),
     )
 
+@router.method
+@admin_or_fee_admin_only
+def migrate_config():
+    """
+    Admin or fee admin method. Migrates contracts created before the packed config to it.
+    Packs the per-key config globals into the config global and deletes them, and creates the
+    byte slice globals added since, which read as uint 0 while missing.
+    Config reads fail until this has run, so call it in the upgrade group right after the update call.
+    Needs two free byte slices in the global schema.
+    """
+    existing = App.globalGetEx(Int(0), str_config)
+    return Seq(
+        existing,
+        custom_assert(Not(existing.hasValue()), err_migrated),
+        gset(
+            str_config,
+            config_pack(
+                [(key, App.globalGet(key)) for key in legacy_config_fields]
+                # no keeper bounty, see queue_update_fees
+                + [(str_swap_keeper_bps, Int(0))]
+            ),
+        ),
+        *[App.globalDel(key) for key in legacy_config_fields],
+        # switches off and policies at their defaults, see lib/storage.py
+        gset(str_tunables, tunables_empty()),
+        gset(str_version, Int(2)),
+    )
+
+
 @router.method
 def configure2(
     lst_asa_name: abi.DynamicBytes,
@@ -168,6 +237,7 @@ def configure2(
         ),
     )
 
+
 @router.method
 @admin_only
 def change_admin_1(new_admin: abi.Address):
@@ -210,12 +280,16 @@ def change_admin_2():
 def change_noderunner(new_noderunner: abi.Address):
     """
     fee admin/node runner method. change node runner address.
-    node runner fees must be withdrawn before this, otherwise fee admin could steal node runner fees.
+    node runner fees for rewards up to now are booked and paid out to the outgoing node runner first,
+    whatever the swap policy, otherwise fee admin could steal node runner fees.
     """
     return Seq(
         Pop(pre_mint_or_redeem()),
-        custom_assert(
-            gget(str_noderunner_fees) == Int(0), err_noderunner_fees_not_zero
+        # rewards the swap policy held back still belong to the outgoing node runner's tenure
+        settle_rewards(get_actual_expected_balance_delta()),
+        If(cget(str_noderunner_fees)).Then(
+            send_algo(gget(str_noderunner_addr), cget(str_noderunner_fees), Int(0)),
+            cset(str_noderunner_fees, Int(0)),
         ),
         gset(str_noderunner_addr, new_noderunner.get()),
     )
@@ -242,6 +316,52 @@ def update_max_balance(new_max_balance: abi.Uint64):
     )
 
 
+@router.method
+@admin_or_fee_admin_only
+def set_config(field: abi.Uint64, value: abi.Uint64):
+    """
+    Admin or fee admin method. Sets tunable $field (index into the tunables map, see lib/storage.py) to $value:
+    0 asa_claim_mode: ASA payouts to receivers that are not opted in are recorded for claim_asa() (see claim.py)
+    1 compact_events: mints and redeem payouts log one packed event (see lib/events.py)
+    2 opup_max_fees: per app call allowance, in microalgo, for OpUp budget top-ups (see lib/opup.py). At most 16 min fees
+    3 swap_min_surplus: swap rewards over this surplus in microalgo (0: 1000 min fees). 0 or at least 100 min fees,
+      so the 3 swap txn fees stay under 3% of a swap
+    4 swap_min_rounds: rounds between swaps. At most max_swap_min_rounds
+    5 swap_max_slippage_bps: swaps priced this far under the reference price are deferred (see lib/rate.py
+      swap_price_ok). At most 10000. Clears the reference price; the next swap sets it again
+    6 swap_max_chunk_bps: swaps sell at most this share of the lp_id pool's ALGO reserves (see lib/rate.py swap_chunk).
+      At most 10000
+    Switches and checks are off at 0
+    """
+    return Seq(
+        custom_assert(field.get() < Int(len(tunable_fields)), err_config_field),
+        If(field.get() == Int(tunable_index(str_opup_max_fees))).Then(
+            custom_assert(value.get() <= Int(16) * Global.min_txn_fee(), err_opup_max),
+        ),
+        If(field.get() == Int(tunable_index(str_swap_min_surplus))).Then(
+            custom_assert(
+                Or(
+                    value.get() == Int(0),
+                    value.get() >= Int(100) * Global.min_txn_fee(),
+                ),
+                err_swap_policy,
+            ),
+        ),
+        If(field.get() == Int(tunable_index(str_swap_min_rounds))).Then(
+            custom_assert(value.get() <= max_swap_min_rounds, err_swap_rounds),
+        ),
+        If(field.get() == Int(tunable_index(str_swap_max_slippage_bps))).Then(
+            custom_assert(value.get() <= Int(10000), err_swap_slippage),
+            gset(str_swap_ref_price, Int(0)),
+        ),
+        If(field.get() == Int(tunable_index(str_swap_max_chunk_bps))).Then(
+            custom_assert(value.get() <= Int(10000), err_swap_chunk),
+        ),
+        tunables_set(field.get() * Int(8), value.get()),
+        invalidate_swap_check(),
+    )
+
+
 @router.method
 @fee_admin_only
 def verify_nfdomains(registry_app_id: abi.Uint64, nfd_app_id: abi.Uint64, name: abi.DynamicBytes):
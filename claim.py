@@ -0,0 +1,90 @@
+from pyteal import (
+    App,
+    Btoi,
+    Bytes,
+    Concat,
+    If,
+    Int,
+    Itob,
+    ScratchVar,
+    Seq,
+    Subroutine,
+    TealType,
+    Txn,
+)
+from lib.err import err_box_del, err_no_claim
+from lib.events import emit_event
+from lib.storage import gget, global_decr, global_incr
+from lib.str import str_asa_claims, str_asa_id
+from lib.utils import custom_assert, send_algo, send_asa
+from router import router
+
+## Deferred ASA claims
+#
+# Cheaper alternative to the ARC59 inbox when paying out ASA to a receiver that is not opted in
+# Enabled with the asa_claim_mode config flag (see admin.set_config)
+# The ASA owed is recorded in a per-user claim box and only the ALGO is sent right away
+# The user calls claim_asa() after opting in to receive the ASA
+#
+# claim box name: "c" + address. value: uint64 ASA amount owed
+# asa_claims global: sum of ASA owed. Excluded from the paired ASA balance, so it does not count towards the rate
+#
+# The claim box MBR is withheld from the ALGO payout when the box is created, and refunded on claim
+
+claim_box_prefix = Bytes("c")
+claim_box_mbr = Int(2500 + 400 * (33 + 8))
+
+
+def claim_box(user):
+    return Concat(claim_box_prefix, user)
+
+
+@Subroutine(TealType.none)
+def record_asa_claim(receiver, algo_amount, asa_amount, txn_fee):
+    """
+    Internal. Records $asa_amount ASA owed to $receiver and sends the ALGO.
+    1 txn fee, and the claim box MBR if the box is new, are subtracted from the ALGO amount
+    """
+    box = App.box_get(claim_box(receiver))
+    return Seq(
+        box,
+        If(box.hasValue())
+        .Then(
+            App.box_put(claim_box(receiver), Itob(Btoi(box.value()) + asa_amount)),
+            send_algo(receiver, algo_amount - txn_fee, txn_fee),
+        )
+        .Else(
+            App.box_put(claim_box(receiver), Itob(asa_amount)),
+            send_algo(receiver, algo_amount - txn_fee - claim_box_mbr, txn_fee),
+        ),
+        global_incr(str_asa_claims, asa_amount),
+        emit_event(
+            "asa_claim_recorded(address,uint64)",  # arc28: receiver, asa_amount
+            receiver,
+            Itob(asa_amount),
+        ),
+    )
+
+
+@router.method
+def claim_asa():
+    """
+    public method. Sends the ASA owed to the caller and refunds the claim box MBR.
+    Caller must be opted in to the ASA. Inner txn fees are paid by the caller
+    """
+    amount = ScratchVar(TealType.uint64)
+    box = App.box_get(claim_box(Txn.sender()))
+    return Seq(
+        box,
+        custom_assert(box.hasValue(), err_no_claim),
+        amount.store(Btoi(box.value())),
+        custom_assert(App.box_delete(claim_box(Txn.sender())), err_box_del),
+        global_decr(str_asa_claims, amount.load()),
+        send_asa(Txn.sender(), gget(str_asa_id), amount.load(), Int(0)),
+        send_algo(Txn.sender(), claim_box_mbr, Int(0)),
+        emit_event(
+            "asa_claim(uint64)",  # arc28: asa_amount
+            Itob(amount.load()),
+        ),
+    )
+
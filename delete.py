@@ -6,9 +6,9 @@ from pyteal import (
     Txn,
 )
 from lib.decorators import admin_only
-from lib.err import err_stake_exists, err_noderunner_fees_exists
+from lib.err import err_claims_exist, err_stake_exists, err_noderunner_fees_exists
 from lib.storage import gget
-from lib.str import str_asa_id, str_noderunner_fees, str_staked
+from lib.str import str_asa_claims, str_asa_id, str_noderunner_fees, str_staked
 from lib.utils import closeout_algo, closeout_asa, custom_assert, delete_lst_asset, is_opted_in
 
 
@@ -19,6 +19,8 @@ def delete_app():
         custom_assert(gget(str_staked) == Int(0), err_stake_exists),
         # no uncollected noderunner fees
         custom_assert(gget(str_noderunner_fees) == Int(0), err_noderunner_fees_exists),
+        # no ASA owed to claimants
+        custom_assert(gget(str_asa_claims) == Int(0), err_claims_exist),
         # LST balance should always be == staked, but if not this will fail
         delete_lst_asset(),
         # Close out any remaining ASA dust to caller
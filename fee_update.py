@@ -13,31 +13,37 @@ from pyteal import (
     abi,
 )
 from lib.decorators import fee_admin_only
-from lib.err import err_delta_platform_fees, err_delta_noderunner_fees, err_no_update
+from lib.err import err_codes, err_delta_platform_fees, err_delta_noderunner_fees, err_no_update, err_swap_keeper
 from lib.events import emit_event
-from lib.storage import gget, gset
+from lib.storage import cset, gget, gset
 from lib.str import (
     bytes_empty,
     str_fee_update,
     str_noderunner_fee_bps,
     str_platform_fee_bps,
+    str_swap_keeper_bps,
     str_fee_update_max_delta,
     str_fee_update_period,
 )
-from lib.utils import abs_diff, custom_assert
+from lib.utils import abs_diff, custom_assert, fail_code
 from router import router
 
-## Time locked, delta constrained fee updates (node runner, platform)
+## Time locked, delta constrained fee updates (node runner, platform, swap keeper bounty)
 
 # fee_update map:
 
 # 0:  [8 bytes] timestamp_applicable uint64
 # 8:  [8 bytes] next_noderunner_fee_bps uint64
 # 16: [8 bytes] next_platform_fee_bps uint64
+# 24: [8 bytes] next_swap_keeper_bps uint64
 
 params_ts_offset = Int(0)  # uint64
 params_noderunner_fee_bps_offset = Int(8)  # uint64
 params_platform_fee_bps_offset = Int(16)  # uint64
+params_swap_keeper_bps_offset = Int(24)  # uint64
+
+# swap_or_fail keeper bounty cap: 1% of the swapped rewards
+max_swap_keeper_bps = 100
 
 
 def get_update_params_ts():
@@ -61,6 +67,14 @@ def get_update_params_platform_fee_bps():
     return ExtractUint64(gget(str_fee_update), params_platform_fee_bps_offset)
 
 
+def get_update_params_swap_keeper_bps():
+    """
+    Returns current fee update's swap keeper bounty in bps.
+    Updates queued before the field existed are 24 bytes long; they keep the current bounty
+    """
+    return ExtractUint64(Concat(gget(str_fee_update), Itob(gget(str_swap_keeper_bps))), params_swap_keeper_bps_offset)
+
+
 @Subroutine(TealType.none)
 def maybe_apply_fee_update():
     """
@@ -73,6 +87,7 @@ def maybe_apply_fee_update():
             apply_fee_updates(
                 get_update_params_noderunner_fee_bps(),
                 get_update_params_platform_fee_bps(),
+                get_update_params_swap_keeper_bps(),
             ),
             # clear fee update field
             gset(str_fee_update, bytes_empty),
@@ -81,18 +96,32 @@ def maybe_apply_fee_update():
 
 
 @Subroutine(TealType.none)
-def apply_fee_updates(noderunner_fee_bps, platform_fee_bps):
+def assert_fee_delta(current_bps, new_bps, code):
+    """
+    internal. fails with error $code if $new_bps is more than fee_update_max_delta away from $current_bps
+    """
+    return If(abs_diff(current_bps, new_bps) <= gget(str_fee_update_max_delta)).Then(Seq()).Else(fail_code(code))
+
+
+@Subroutine(TealType.none)
+def apply_fee_updates(noderunner_fee_bps, platform_fee_bps, swap_keeper_bps):
     return Seq(
         # apply new noderunner fee
-        gset(str_noderunner_fee_bps, noderunner_fee_bps),
+        cset(str_noderunner_fee_bps, noderunner_fee_bps),
         # apply new platform fee
-        gset(str_platform_fee_bps, platform_fee_bps),
-        # log event
+        cset(str_platform_fee_bps, platform_fee_bps),
+        # apply new swap keeper bounty
+        gset(str_swap_keeper_bps, swap_keeper_bps),
+        # log events
         emit_event(
             "fee_update(uint64,uint64)",  # arc28: noderunner_fee_bps, platform_fee_bps
             Itob(noderunner_fee_bps),
             Itob(platform_fee_bps),
         ),
+        emit_event(
+            "swap_keeper_update(uint64)",  # arc28: swap_keeper_bps
+            Itob(swap_keeper_bps),
+        ),
     )
 
 
@@ -101,40 +130,51 @@ def apply_fee_updates(noderunner_fee_bps, platform_fee_bps):
 def queue_update_fees(
     new_platform_fee_bps: abi.Uint64,
     new_noderunner_fee_bps: abi.Uint64,
+    new_swap_keeper_bps: abi.Uint64,
     *,
     output: abi.Uint64
 ):
     """
     Fee admin method. Changes enforced to +/- 2.5% delta max
-    If increasing fees, schedules an update of the node+platform fees in bps.
+    If increasing fees, schedules an update of the node+platform fees and the swap_or_fail keeper bounty in bps.
+    The keeper bounty is at most max_swap_keeper_bps.
     Decreasing fees are applied immediately.
     Return timestamp of applicability as uint64
     """
     wen = ScratchVar(TealType.uint64)
     return Seq(
         # enforce noderunner fee delta restriction
-        custom_assert(
-            abs_diff(gget(str_noderunner_fee_bps), new_noderunner_fee_bps.get())
-            <= gget(str_fee_update_max_delta),
-            err_delta_noderunner_fees,
+        assert_fee_delta(
+            gget(str_noderunner_fee_bps),
+            new_noderunner_fee_bps.get(),
+            Int(err_codes[err_delta_noderunner_fees]),
         ),
         # enforce platform fee delta restriction
-        custom_assert(
-            abs_diff(gget(str_platform_fee_bps), new_platform_fee_bps.get())
-            <= gget(str_fee_update_max_delta),
-            err_delta_platform_fees,
+        assert_fee_delta(
+            gget(str_platform_fee_bps),
+            new_platform_fee_bps.get(),
+            Int(err_codes[err_delta_platform_fees]),
+        ),
+        # enforce keeper bounty cap and delta restriction
+        custom_assert(new_swap_keeper_bps.get() <= Int(max_swap_keeper_bps), err_swap_keeper),
+        assert_fee_delta(
+            gget(str_swap_keeper_bps),
+            new_swap_keeper_bps.get(),
+            Int(err_codes[err_swap_keeper]),
         ),
         # fee reductions can apply instantly
         If(
             And(
                 new_noderunner_fee_bps.get() <= gget(str_noderunner_fee_bps),
                 new_platform_fee_bps.get() <= gget(str_platform_fee_bps),
+                new_swap_keeper_bps.get() <= gget(str_swap_keeper_bps),
             )
         )
         .Then(
             apply_fee_updates(
                 new_noderunner_fee_bps.get(),
                 new_platform_fee_bps.get(),
+                new_swap_keeper_bps.get(),
             ),
             output.set(Int(0)),
         )
@@ -148,6 +188,7 @@ def queue_update_fees(
                     Itob(wen.load()),
                     Itob(new_noderunner_fee_bps.get()),
                     Itob(new_platform_fee_bps.get()),
+                    Itob(new_swap_keeper_bps.get()),
                 ),
             ),
             emit_event(
@@ -156,6 +197,11 @@ def queue_update_fees(
                 Itob(new_noderunner_fee_bps.get()),
                 Itob(new_platform_fee_bps.get()),
             ),
+            emit_event(
+                "queue_swap_keeper_update(uint64,uint64)",  # arc28: applicable_at, swap_keeper_bps
+                Itob(wen.load()),
+                Itob(new_swap_keeper_bps.get()),
+            ),
             # return timestamp of applicability
             output.set(wen.load()),
         ),
@@ -9,6 +9,7 @@ from pyteal import (
     Itob,
     Len,
     Not,
+    Pop,
     ScratchVar,
     Seq,
     Subroutine,
@@ -18,9 +19,18 @@ from pyteal import (
     TxnType,
     abi,
 )
+from claim import record_asa_claim
+from lib.opup import arc59_min_budget, ensure_budget
 from lib.storage import gget
-from lib.str import str_arc59_app_id
-from lib.utils import custom_assert, is_opted_in, send_algo, send_asa
+from lib.str import str_arc59_app_id, str_asa_claim_mode
+from lib.utils import (
+    axfer_fields,
+    custom_assert,
+    is_opted_in,
+    itxn_group,
+    payment_fields,
+    send_algo,
+)
 from lib.err import err_fees
 
 # extra_fields{} for different fee structures
@@ -46,11 +56,14 @@ def arc59_send_asa_and_algo(receiver, algo_amount, asa_id, asa_amount):
     router_opted_in = abi.Bool()
     arc59Address = AppParam.address(gget(str_arc59_app_id))
     algo_diff = ScratchVar(TealType.uint64)
+    send_fee = ScratchVar(TealType.uint64)
     receiver_inbox_address = abi.Address()
     amount = ScratchVar(TealType.uint64)
     return Seq(
         # store initial balance, convert into a diff after done
         algo_diff.store(Balance(Global.current_application_address())),
+        # OpUp fees fall inside the balance diff, so the receiver pays them like other ARC59 costs
+        Pop(ensure_budget(arc59_min_budget, Global.min_txn_fee())),
 
         InnerTxnBuilder.ExecuteMethodCall(
             app_id=gget(str_arc59_app_id),
@@ -96,30 +109,37 @@ def arc59_send_asa_and_algo(receiver, algo_amount, asa_id, asa_amount):
             receiver_inbox_address.decode(Substring(InnerTxn.last_log(), Int(4), Len(InnerTxn.last_log()))),
         ),
 
-        InnerTxnBuilder.ExecuteMethodCall(
-            app_id=gget(str_arc59_app_id),
-            method_signature="arc59_sendAsset(axfer,address,uint64)address",
-            args=[
-                {
-                    TxnField.type_enum: TxnType.AssetTransfer,
-                    TxnField.asset_receiver: arc59Address.value(),
-                    TxnField.xfer_asset: asa_id,
-                    TxnField.asset_amount: asa_amount,
-                    TxnField.fee: Global.min_txn_fee(),
-                },
-                receiver,
-                Itob(Int(0)),
-            ],
-            extra_fields={
-                TxnField.fee: If(is_opted_in(receiver_inbox_address.get(), asa_id))
-                    .Then(Int(2) * Global.min_txn_fee())
-                    .Else(Int(4) * Global.min_txn_fee()),
-            }
+        send_fee.store(
+            If(is_opted_in(receiver_inbox_address.get(), asa_id))
+            .Then(Int(2) * Global.min_txn_fee())
+            .Else(Int(4) * Global.min_txn_fee())
+        ),
+        # ALGO spent so far, plus the fees of the final group: axfer, sendAsset call and ALGO payout
+        algo_diff.store(
+            algo_diff.load() - Balance(Global.current_application_address())
+            + Int(2) * Global.min_txn_fee() + send_fee.load()
         ),
 
-        algo_diff.store(algo_diff.load() - Balance(Global.current_application_address())),
-
-        send_algo(receiver, algo_amount - algo_diff.load() - Global.min_txn_fee(), Global.min_txn_fee()),
+        # sendAsset and the ALGO payout in one inner group
+        itxn_group(
+            InnerTxnBuilder.MethodCall(
+                app_id=gget(str_arc59_app_id),
+                method_signature="arc59_sendAsset(axfer,address,uint64)address",
+                args=[
+                    {
+                        TxnField.type_enum: TxnType.AssetTransfer,
+                        TxnField.asset_receiver: arc59Address.value(),
+                        TxnField.xfer_asset: asa_id,
+                        TxnField.asset_amount: asa_amount,
+                        TxnField.fee: Global.min_txn_fee(),
+                    },
+                    receiver,
+                    Itob(Int(0)),
+                ],
+                extra_fields={TxnField.fee: send_fee.load()},
+            ),
+            payment_fields(receiver, algo_amount - algo_diff.load(), Global.min_txn_fee()),
+        ),
     )
 
 def send_algo_and_asa(receiver, algo_amount, asa_id, asa_amount, txn_fee):
@@ -127,13 +147,18 @@ def send_algo_and_asa(receiver, algo_amount, asa_id, asa_amount, txn_fee):
     Send ALGO+ASA. if txn_fee is set to Global.min_txn_fee, fees subtracted from algo amount
     If receiver is opted in, ALGO amount is -= by 2 min txn fees and ASA is sent directly.
     If receiver is not opted in, ARC59 inbox is used to send, and txn fees are subtracted from the ALGO amount
+    In ASA claim mode the ASA is recorded for claim_asa() instead of using ARC59, see claim.py
     """
     return Seq(
         If(is_opted_in(receiver, asa_id)).Then(
-            # send asset, paying min fee
-            send_asa(receiver, asa_id, asa_amount, txn_fee),
-            # send algo, paying min fee, subtract 2 min fees from amount for the txns
-            send_algo(receiver, algo_amount - Int(2) * txn_fee, txn_fee),
+            # send asset and algo in one inner group, pooling both fees on the asset transfer
+            # subtract 2 min fees from amount for the txns
+            itxn_group(
+                axfer_fields(receiver, asa_id, asa_amount, Int(2) * txn_fee),
+                payment_fields(receiver, algo_amount - Int(2) * txn_fee, Int(0)),
+            ),
+        ).ElseIf(gget(str_asa_claim_mode)).Then(
+            record_asa_claim(receiver, algo_amount, asa_amount, txn_fee),
         ).Else(
             custom_assert(txn_fee > Int(0), err_fees),
             arc59_send_asa_and_algo(receiver, algo_amount, asa_id, asa_amount),
@@ -1,32 +1,29 @@
 from pyteal import Int, Seq, Subroutine, TealType, Txn
 from lib.err import err_inited
-from lib.storage import gget, gset
+from lib.storage import config_empty, gget, gset, tunables_empty
 from lib.str import (
     bytes_empty,
     str_admin_addr,
-    str_arc59_app_id,
-    str_asa_id,
+    str_asa_claims,
+    str_config,
     str_contract_upgrade,
-    str_delay_optin,
     str_fee_addr,
     str_fee_update,
-    str_fee_update_max_delta,
-    str_fee_update_period,
     str_lp_id,
     str_lp_type,
     str_lst_id,
-    str_max_balance,
     str_noderunner_addr,
-    str_noderunner_fee_bps,
     str_noderunner_fees,
-    str_platform_fee_bps,
     str_platform_fees,
     str_protest_count,
     str_protest_sum,
-    str_rate_precision,
     str_staked,
-    str_tm2_app_id,
-    str_upgrade_period,
+    str_swap_check_round,
+    str_last_swap_round,
+    str_swap_pending,
+    str_swap_ref_price,
+    str_swap_ref_round,
+    str_tunables,
     str_version,
 )
 from lib.utils import custom_assert
@@ -38,16 +35,16 @@ def create_storage():
     Runs on app creation; Initializes global state
     """
     return Seq(
-        custom_assert(gget(str_asa_id) == Int(0), err_inited),
-        gset(str_version, Int(1)),
-        gset(str_asa_id, Int(0)),
+        custom_assert(gget(str_version) == Int(0), err_inited),
+        gset(str_version, Int(2)),
+        # zeroed packed config: asa_id, fee bps, periods, max_balance etc. See lib/storage.py
+        gset(str_config, config_empty()),
+        # zeroed tunables: switches off, policies at their defaults
+        gset(str_tunables, tunables_empty()),
         gset(str_lst_id, Int(0)),
-        gset(str_delay_optin, Int(0)),
         gset(str_staked, Int(0)),
         gset(str_platform_fees, Int(0)),
         gset(str_noderunner_fees, Int(0)),
-        gset(str_platform_fee_bps, Int(0)),
-        gset(str_noderunner_fee_bps, Int(0)),
         gset(str_admin_addr, Txn.sender()),
         gset(str_fee_addr, Txn.sender()),
         gset(str_noderunner_addr, Txn.sender()),
@@ -57,11 +54,10 @@ def create_storage():
         gset(str_contract_upgrade, bytes_empty),
         gset(str_protest_count, Int(0)),
         gset(str_protest_sum, Int(0)),
-        gset(str_upgrade_period, Int(0)),
-        gset(str_fee_update_period, Int(0)),
-        gset(str_fee_update_max_delta, Int(0)),
-        gset(str_max_balance, Int(0)),
-        gset(str_rate_precision, Int(0)),
-        gset(str_tm2_app_id, Int(0)),
-        gset(str_arc59_app_id, Int(0)),
-    )
\ No newline at end of file
+        gset(str_swap_check_round, Int(0)),
+        gset(str_last_swap_round, Int(0)),
+        gset(str_swap_ref_price, Int(0)),
+        gset(str_swap_ref_round, Int(0)),
+        gset(str_swap_pending, Int(0)),
+        gset(str_asa_claims, Int(0)),
+    )
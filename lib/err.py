@@ -53,4 +53,29 @@ err_chadm_not_called_by_new_admin = "ERR NA" # Changing admin: call 2 failed nex
 err_noderunner_fees_not_zero = "ERR FEE" # Changing noderunner but previous noderunner has fees to be paid out
 err_configured = "ERR CFGD" # Configure called but the contract is configured already
 err_tm2_pool = "ERR TM2" # Tinyman pool provided did not match asset ID
-err_arc59_hash = "ERR ARC59" # arc59 approval hash did not validate
\ No newline at end of file
+err_arc59_hash = "ERR ARC59" # arc59 approval hash did not validate
+err_migrated = "ERR MIGR" # migrate_config called but the packed config already exists
+err_no_claim = "ERR NO CLM" # claim_asa called but the caller has no ASA owed
+err_claims_exist = "ERR CLM" # Error deleting: ASA claims outstanding
+err_opup_max = "ERR OPUP" # OpUp fee allowance over the maximum
+err_swap_policy = "ERR SWP MIN" # swap minimum surplus under 100 min fees
+err_swap_slippage = "ERR SLIP" # swap slippage bound over 10000 bps
+err_swap_chunk = "ERR CHUNK" # swap chunk bound over 10000 bps
+err_swap_keeper = "ERR KEEPER" # swap keeper bounty over max_swap_keeper_bps, or changed by more than the fee update delta
+err_swap_rounds = "ERR SWP RND" # swap minimum rounds over max_swap_min_rounds
+err_config_field = "ERR CFG" # set_config field index out of range
+
+## Numeric error codes
+#
+# Failing asserts log "ERR " + a one byte code instead of the full message (see lib/utils.py custom_assert)
+# Codes follow definition order above, starting at 1. Append new errors at the end to keep codes stable
+
+err_messages = [value for name, value in list(globals().items()) if name.startswith("err_")]
+err_codes = {message: code for code, message in enumerate(err_messages, start=1)}
+
+
+def decode_error(log):
+    """
+    client helper: error message for a logged error code, e.g. b"ERR \\x01" -> "ERR UNAUTH"
+    """
+    return err_messages[log[-1] - 1]
@@ -1,5 +1,7 @@
-from pyteal import Log, Concat, Bytes
+from pyteal import If, Log, Concat, Bytes, Seq
 from Cryptodome.Hash import SHA512
+from lib.storage import gget
+from lib.str import str_compact_events
 
 
 def sha512_256(data):
@@ -14,3 +16,18 @@ def arc28_header(event_definition):
 
 def emit_event(event_definition, *args):
     return Log(Concat(arc28_header(event_definition), *args))
+
+
+## Compact events
+#
+# With the compact_events flag set, mint() and redeem payouts log a single fixed-width
+# mint_v2/redeem_v2 record instead of the separate rate, mint/redeem and asa_balance events.
+# Both are emitted with emit_compact_or_verbose, which reads the flag once
+
+
+def compact_events():
+    return gget(str_compact_events)
+
+
+def emit_compact_or_verbose(compact_event, *verbose_events):
+    return If(compact_events()).Then(compact_event).Else(Seq(*verbose_events))
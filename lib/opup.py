@@ -0,0 +1,73 @@
+from pyteal import (
+    And,
+    Bytes,
+    Global,
+    InnerTxnBuilder,
+    Int,
+    OnComplete,
+    ScratchVar,
+    Seq,
+    Subroutine,
+    TealType,
+    TxnField,
+    TxnType,
+    While,
+)
+from lib.storage import gget
+from lib.str import str_opup_max_fees
+
+## Opcode budget top-up
+#
+# ensure_budget() issues inner OpUp calls (create + delete a trivial app, +700 pooled budget each)
+# until Global.opcode_budget() reaches the required budget for the next expensive section.
+# OpUp calls in one app call are bounded by the opup_max_fees config field, in microalgo at one
+# min fee per call. 0 disables top-ups; callers then pad with nullun() as before.
+#
+# Required budgets below are estimates for the inner calls that run on the pooled budget.
+
+swap_min_budget = Int(1400)
+arc59_min_budget = Int(2100)
+page_hash_min_budget = Int(700)
+
+# approval and clear program of the OpUp app: #pragma version 6; int 1
+opup_program = Bytes("base16", "068101")
+
+# fixed slot: min fees' worth of OpUp calls issued in this app call. Scratch starts zeroed.
+opup_spent = ScratchVar(TealType.uint64, 239)
+
+
+@Subroutine(TealType.uint64)
+def ensure_budget(min_budget, fee):
+    """
+    Issues OpUp calls until the opcode budget is at least $min_budget, or the opup_max_fees allowance
+    for this app call is used up. Each call pays $fee: min fee paid by the escrow, or 0 to draw on
+    the caller's pooled fees. Returns the fees paid by the escrow
+    """
+    paid = ScratchVar(TealType.uint64)
+    return Seq(
+        paid.store(Int(0)),
+        While(And(
+            Global.opcode_budget() < min_budget,
+            opup_spent.load() + Global.min_txn_fee() <= gget(str_opup_max_fees),
+        )).Do(
+            opup_spent.store(opup_spent.load() + Global.min_txn_fee()),
+            paid.store(paid.load() + fee),
+            InnerTxnBuilder.Execute(
+                {
+                    TxnField.type_enum: TxnType.ApplicationCall,
+                    TxnField.on_completion: OnComplete.DeleteApplication,
+                    TxnField.approval_program: opup_program,
+                    TxnField.clear_state_program: opup_program,
+                    TxnField.fee: fee,
+                }
+            ),
+        ),
+        paid.load(),
+    )
+
+
+def opup_allowance():
+    """
+    fees ensure_budget() can still pay in this app call; bounds its return value
+    """
+    return gget(str_opup_max_fees) - opup_spent.load()
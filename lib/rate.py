@@ -5,6 +5,7 @@ from pyteal import (
     Global,
     If,
     Int,
+    Itob,
     MinBalance,
     Or,
     Return,
@@ -12,14 +13,20 @@ from pyteal import (
     Seq,
     Subroutine,
     TealType,
+    Txn,
     WideRatio,
 )
 from fee_update import maybe_apply_fee_update
 from lib.err import err_not_implemented, err_no_pre
-from lib.storage import gget, global_incr, gset
+from lib.events import emit_event
+from lib.opup import ensure_budget, opup_allowance, swap_min_budget
+from lib.storage import cache_load, cached_incr, cget, cset, gget, gset
 from lib.str import (
+    str_asa_claims,
     str_asa_id,
     str_delay_optin,
+    str_last_swap_round,
+    str_lp_id,
     str_lp_type,
     str_noderunner_fee_bps,
     str_noderunner_fees,
@@ -27,9 +34,17 @@ from lib.str import (
     str_platform_fees,
     str_rate_precision,
     str_staked,
+    str_swap_check_round,
+    str_swap_max_chunk_bps,
+    str_swap_min_rounds,
+    str_swap_min_surplus,
+    str_swap_max_slippage_bps,
+    str_swap_pending,
+    str_swap_ref_price,
+    str_swap_ref_round,
 )
-from lib.swap import swap_tm2_algo_asa
-from lib.utils import custom_assert, fail, get_asset_balance, send_asa
+from lib.swap import get_price, get_tm2_algo_reserves, swap_tm2_algo_asa
+from lib.utils import custom_assert, fail, get_asset_balance, send_algo, send_asa
 
 swap_enforced = ScratchVar(TealType.uint64, 255)
 swap_enforced_magic_value = Int(255255255)
@@ -41,18 +56,30 @@ def pre_mint_or_redeem():
     Pre mint or redeem: Apply any pending fee updates & swap if needed
     Must be called before any operation that calculates the rate
     Returns 1 if a swap was performed
+    The full check runs once per round: fee updates are timestamp based and rewards are paid
+    at the end of the block, so mints/redeems later in the same round skip it.
+    Anything else that changes the surplus calls invalidate_swap_check()
     """
+    surplus = ScratchVar(TealType.uint64)
     return Seq(
+        # load hot globals into scratch for the rest of the app call
+        cache_load(),
         # Using scratch for runtime enforcement of must-swap-before-rate
         swap_enforced.store(swap_enforced_magic_value),
+        # already checked this round
+        If(gget(str_swap_check_round) == Global.round()).Then(Return(Int(0))),
+        gset(str_swap_check_round, Global.round()),
         # apply any pending fee updates
         maybe_apply_fee_update(),
+        # surplus is computed once and shared by need_swap and swap
+        # maybe_optin does not change it: expected balance already includes the optin MBR + fee
+        surplus.store(get_actual_expected_balance_delta()),
         # if rewards have been paid out, swap them
-        If(need_swap())
+        If(need_swap(surplus.load()))
         .Then(
             # opt in if we are delaying optin
             maybe_optin(),
-            Return(swap()),
+            Return(swap(surplus.load(), Int(0))),
         )
         .Else(
             Return(Int(0)),
@@ -60,64 +87,183 @@ def pre_mint_or_redeem():
     )
 
 
+def invalidate_swap_check():
+    """
+    Forces the next pre_mint_or_redeem in this round to run the full fee update & swap check
+    """
+    return gset(str_swap_check_round, Int(0))
+
+
 @Subroutine(TealType.uint64)
-def swap():
-    total_rewards_amt = ScratchVar(TealType.uint64)
-    plat_fee_amt = ScratchVar(TealType.uint64)
-    node_fee_amt = ScratchVar(TealType.uint64)
+def swap(surplus, keeper_bps):
+    """
+    Swap surplus (see get_actual_expected_balance_delta) minus fees, plus any pending remainder, into the paired ASA
+    keeper_bps: share of the rewards paid to the caller if the swap executes, see swap_or_fail. 0 from pre_mint_or_redeem
+    """
+    keeper_amt = ScratchVar(TealType.uint64)
     swap_amt = ScratchVar(TealType.uint64)
+    asa_amt = ScratchVar(TealType.uint64)
     return Seq(
-        # surplus = actual balance - expected balance
-        # we subtract 3x min fees needed to swap
-        total_rewards_amt.store(
-            get_actual_expected_balance_delta() - Int(3) * Global.min_txn_fee(),
-        ),
-        # platform fees
-        plat_fee_amt.store(
-            gget(str_platform_fee_bps) * total_rewards_amt.load() / Int(10000)
-        ),
-        global_incr(str_platform_fees, plat_fee_amt.load()),
-        # node runner fees
-        node_fee_amt.store(
-            gget(str_noderunner_fee_bps) * total_rewards_amt.load() / Int(10000)
-        ),
-        global_incr(str_noderunner_fees, node_fee_amt.load()),
-        # swap amount: subtract fees
-        swap_amt.store(
-            total_rewards_amt.load() - node_fee_amt.load() - plat_fee_amt.load()
-        ),
-        If(gget(str_lp_type) == Bytes("tm2"))
-        .Then(swap_tm2_algo_asa(swap_amt.load()))
+        # keeper bounty, including its payout txn fee; not paid if it would not cover the fee
+        keeper_amt.store(keeper_bps * surplus / Int(10000)),
+        If(keeper_amt.load() <= Global.min_txn_fee()).Then(keeper_amt.store(Int(0))),
+        # book platform and noderunner fees; the net joins swap_pending
+        settle_rewards(surplus),
+        # the swap amount leaves out the 3 min fees needed to swap, the keeper bounty and the most
+        # OpUp fees the swap's budget can cost, so it does not depend on the opcode budget left.
+        # Unspent OpUp reserve stays pending for the next swap.
+        # the swap threshold is over 100 min fees, so pending covers these (see need_swap)
+        swap_amt.store(swap_chunk(
+            gget(str_swap_pending) - Int(3) * Global.min_txn_fee() - opup_allowance() - keeper_amt.load()
+        )),
+        If(gget(str_lp_type) != Bytes("tm2")).Then(fail(err_not_implemented)),
+        asa_amt.store(get_price(gget(str_lp_id), swap_amt.load())),
+        If(swap_price_ok(swap_amt.load(), asa_amt.load()))
+        .Then(
+            # top up the budget only for a swap that executes, so deferred swaps cost no OpUp fees
+            gset(
+                str_swap_pending,
+                gget(str_swap_pending) - swap_amt.load() - Int(3) * Global.min_txn_fee() - keeper_amt.load()
+                - ensure_budget(swap_min_budget, Global.min_txn_fee()),
+            ),
+            gset(str_last_swap_round, Global.round()),
+            update_swap_ref_price(swap_amt.load(), asa_amt.load()),
+            If(keeper_amt.load()).Then(
+                send_algo(Txn.sender(), keeper_amt.load() - Global.min_txn_fee(), Global.min_txn_fee()),
+            ),
+            swap_tm2_algo_asa(swap_amt.load(), asa_amt.load()),
+        )
         .Else(
-            fail(err_not_implemented),
+            # rewards stay in the escrow; the next check after this round retries
+            # after swap_ref_resync_rounds without a swap, a deferral moves the reference towards the pool price,
+            # at most once per round
+            If(And(
+                Global.round() >= gget(str_last_swap_round) + swap_ref_resync_rounds,
+                gget(str_swap_ref_round) != Global.round(),
+            )).Then(
+                gset(str_swap_ref_round, Global.round()),
+                update_swap_ref_price(swap_amt.load(), asa_amt.load()),
+            ),
+            emit_event(
+                "swap_deferred(uint64,uint64,uint64)",  # arc28: algo_amount, asa_amount, ref_price
+                Itob(swap_amt.load()),
+                Itob(asa_amt.load()),
+                Itob(gget(str_swap_ref_price)),
+            ),
             Int(0),
         ),
     )
 
 
+@Subroutine(TealType.none)
+def settle_rewards(surplus):
+    """
+    Books platform and node runner fees on $surplus and carries the rest in swap_pending for a later swap.
+    Leaves no surplus whatever the swap policy, e.g. before the node runner changes
+    """
+    plat_fee_amt = ScratchVar(TealType.uint64)
+    node_fee_amt = ScratchVar(TealType.uint64)
+    return Seq(
+        plat_fee_amt.store(cget(str_platform_fee_bps) * surplus / Int(10000)),
+        node_fee_amt.store(cget(str_noderunner_fee_bps) * surplus / Int(10000)),
+        cached_incr(str_platform_fees, plat_fee_amt.load()),
+        cached_incr(str_noderunner_fees, node_fee_amt.load()),
+        gset(str_swap_pending, gget(str_swap_pending) + surplus - plat_fee_amt.load() - node_fee_amt.load()),
+    )
+
+
+## Chunked swaps
+#
+# With swap_max_chunk_bps set, a swap sells at most that share of the lp_id pool's ALGO reserves.
+# The rest of the net amount is carried in swap_pending: it counts towards the expected balance, so fees
+# are not taken on it twice, and towards the swap threshold, so later checks swap it in further chunks
+# (spaced out by swap_min_rounds). a swap_max_chunk_bps of 0 swaps everything pending at the next swap
+
+
+@Subroutine(TealType.uint64)
+def swap_chunk(amount):
+    """
+    $amount capped at swap_max_chunk_bps of the lp_id pool's ALGO reserves
+    """
+    cap = ScratchVar(TealType.uint64)
+    return Seq(
+        If(gget(str_swap_max_chunk_bps) == Int(0)).Then(Return(amount)),
+        cap.store(WideRatio([get_tm2_algo_reserves(gget(str_lp_id)), gget(str_swap_max_chunk_bps)], [Int(10000)])),
+        If(amount > cap.load()).Then(cap.load()).Else(amount),
+    )
+
+
+## Swap reference price
+#
+# swap_ref_price: rolling average of executed swap prices, ASA per ALGO scaled by rate_precision.
+# Each executed swap moves it a quarter of the way to its own price; 0 until the first swap.
+# A swap whose pool price is more than swap_max_slippage_bps under the reference is deferred and logged,
+# so a pool skewed in the same group can not force a bad trade. 0 bps disables the check.
+# After a lasting move in the ASA price the reference resyncs on its own: once swap_ref_resync_rounds
+# have passed since the last executed swap, a deferred swap moves it a quarter of the way to the pool price,
+# as an executed swap would. swap_ref_rnd records the round of the last such step, so it moves at most once
+# per round: the swap check itself can run several times in a round (invalidate_swap_check, swap_or_fail).
+# setting swap_max_slippage_bps (admin.set_config) clears the reference outright
+
+swap_ref_resync_rounds = Int(1000)
+
+
+def swap_price(algo_amount, asa_amount):
+    return WideRatio([asa_amount, cget(str_rate_precision)], [algo_amount])
+
+
+@Subroutine(TealType.uint64)
+def swap_price_ok(algo_amount, asa_amount):
+    """
+    false if swapping $algo_amount for $asa_amount is over the slippage bound from the reference price,
+    or the pool would pay out nothing
+    """
+    return And(
+        asa_amount > Int(0),
+        Or(
+            gget(str_swap_max_slippage_bps) == Int(0),
+            gget(str_swap_ref_price) == Int(0),
+            swap_price(algo_amount, asa_amount) >= WideRatio(
+                [gget(str_swap_ref_price), Int(10000) - gget(str_swap_max_slippage_bps)],
+                [Int(10000)],
+            ),
+        ),
+    )
+
+
+def update_swap_ref_price(algo_amount, asa_amount):
+    return gset(
+        str_swap_ref_price,
+        If(gget(str_swap_ref_price) == Int(0))
+        .Then(swap_price(algo_amount, asa_amount))
+        .Else((Int(3) * gget(str_swap_ref_price) + swap_price(algo_amount, asa_amount)) / Int(4)),
+    )
+
+
 @Subroutine(TealType.none)
 def maybe_optin():
-    return If(gget(str_delay_optin)).Then(
+    return If(cget(str_delay_optin)).Then(
         send_asa(
             Global.current_application_address(),
-            gget(str_asa_id),
+            cget(str_asa_id),
             Int(0),
             Global.min_txn_fee(),
         ),
-        gset(str_delay_optin, Int(0)),
+        cset(str_delay_optin, Int(0)),
     )
 
 
 @Subroutine(TealType.uint64)
 def get_expected_balance():
     """
-    The "equilibrium" balance of the contract. Staked ALGO + fees + minimum balance
+    The "equilibrium" balance of the contract. Staked ALGO + fees + pending swap remainder + minimum balance
     Used as baseline to determine "need to swap"
     """
     return (
-        gget(str_staked)
-        + gget(str_platform_fees)
-        + gget(str_noderunner_fees)
+        cget(str_staked)
+        + cget(str_platform_fees)
+        + cget(str_noderunner_fees)
+        + gget(str_swap_pending)
         + get_min_balance()
     )
 
@@ -127,7 +273,7 @@ def get_min_balance():
     Get minimum balance, factoring in delayed optin fee of 0.1A + 1 txn fee
     """
     return MinBalance(Global.current_application_address()) + If(
-        gget(str_delay_optin)
+        cget(str_delay_optin)
     ).Then(Global.asset_opt_in_min_balance() + Global.min_txn_fee()).Else(Int(0))
 
 
@@ -148,19 +294,41 @@ def get_actual_expected_balance_delta():
     )
 
 
-def need_swap():
+@Subroutine(TealType.uint64)
+def need_swap(surplus):
     """
-    Calculate if we need to swap - if escrow balance surplus exceeds 1000x min fees - 1 ALGO currently
+    Calculate if we need to swap - if escrow balance surplus plus any pending chunked swap remainder exceeds
+    the swap threshold (see get_swap_min_surplus) and at least swap_min_rounds rounds have passed since the last swap
+    surplus: get_actual_expected_balance_delta(), computed once by the caller and passed on to swap()
     """
     return And(
         Or(
             # here we are guarding against forcing an early optin despite delay_optin
             # if delay_optin is 1: only swap when we are over the payouts_min_balance
-            gget(str_delay_optin) == Int(0),
+            cget(str_delay_optin) == Int(0),
             get_actual_balance() > Global.payouts_min_balance(),
         ),
-        gget(str_staked) > Int(0),
-        get_actual_expected_balance_delta() > Global.min_txn_fee() * Int(1000),  # 1 ALGO at 0.001 min fee
+        cget(str_staked) > Int(0),
+        # the threshold is over 100 min fees, so a swap of only pending remainder covers its own swap cost
+        surplus + gget(str_swap_pending) > get_swap_min_surplus(),
+        # hysteresis: space swaps out by swap_min_rounds
+        Global.round() >= gget(str_last_swap_round) + gget(str_swap_min_rounds),
+    )
+
+
+# upper bound for swap_min_rounds, about a month of rounds. Keeps last_swap_round + swap_min_rounds
+# far from overflowing, which would fail every need_swap check
+max_swap_min_rounds = Int(1000000)
+
+
+def get_swap_min_surplus():
+    """
+    Swap threshold: swap_min_surplus, or 1000x min fees (1 ALGO at 0.001 min fee) if unset
+    """
+    return (
+        If(gget(str_swap_min_surplus))
+        .Then(gget(str_swap_min_surplus))
+        .Else(Global.min_txn_fee() * Int(1000))
     )
 
 
@@ -172,16 +340,16 @@ def _get_rate():
         # This is a runtime enforcement that the pre_mint_or_redeem method is always called upstream
         # before calculating this rate
         custom_assert(swap_enforced.load() == swap_enforced_magic_value, err_no_pre),
-        If(gget(str_staked) == Int(0))
+        If(cget(str_staked) == Int(0))
         .Then(
             Int(0),
         )
         .Else(
             WideRatio(
-                [gget(str_rate_precision), get_paired_asa_balance()],
-                [gget(str_staked)],
+                [cget(str_rate_precision), get_paired_asa_balance()],
+                [cget(str_staked)],
             ),
-        ),
+        )
     )
 
 
@@ -190,4 +358,7 @@ def get_actual_balance():
 
 
 def get_paired_asa_balance():
-    return get_asset_balance(gget(str_asa_id))
\ No newline at end of file
+    """
+    ASA balance backing dualSTAKE: escrow balance minus ASA owed to claimants (see claim.py)
+    """
+    return get_asset_balance(cget(str_asa_id)) - gget(str_asa_claims)
\ No newline at end of file
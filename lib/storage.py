@@ -1,10 +1,175 @@
-from pyteal import App
+from pyteal import (
+    App,
+    BytesZero,
+    Concat,
+    ExtractUint64,
+    Int,
+    Itob,
+    Replace,
+    ScratchVar,
+    Seq,
+    Subroutine,
+    TealType,
+)
+from lib.str import (
+    str_arc59_app_id,
+    str_asa_claim_mode,
+    str_asa_id,
+    str_compact_events,
+    str_config,
+    str_delay_optin,
+    str_fee_update_max_delta,
+    str_fee_update_period,
+    str_max_balance,
+    str_noderunner_fee_bps,
+    str_noderunner_fees,
+    str_opup_max_fees,
+    str_platform_fee_bps,
+    str_platform_fees,
+    str_rate_precision,
+    str_staked,
+    str_swap_keeper_bps,
+    str_swap_max_chunk_bps,
+    str_swap_max_slippage_bps,
+    str_swap_min_rounds,
+    str_swap_min_surplus,
+    str_tm2_app_id,
+    str_tunables,
+    str_upgrade_period,
+)
+
+## Packed config
+#
+# Read-mostly uint64 configuration lives in two packed globals at fixed offsets:
+# str_config holds the configure() time fields and fees, str_tunables the switches and policy knobs
+# set with admin.set_config(). gget/gset on these keys transparently read/write the packed field;
+# the str_* key names of the configure() time fields are only stored as globals by contracts
+# that have not run migrate_config() yet.
+# A global's key plus value is at most 128 bytes, so each packed global holds at most 15 fields.
+#
+# config map:
+
+# 0:  [8 bytes] asa_id uint64
+# 8:  [8 bytes] tm2_app_id uint64
+# 16: [8 bytes] arc59_app_id uint64
+# 24: [8 bytes] rate_precision uint64
+# 32: [8 bytes] platform_fee_bps uint64
+# 40: [8 bytes] noderunner_fee_bps uint64
+# 48: [8 bytes] upgrade_period uint64
+# 56: [8 bytes] fee_update_period uint64
+# 64: [8 bytes] fee_update_max_delta uint64
+# 72: [8 bytes] max_balance uint64
+# 80: [8 bytes] delay_optin uint64
+# 88: [8 bytes] swap_keeper_bps uint64
+
+config_fields = [
+    str_asa_id,
+    str_tm2_app_id,
+    str_arc59_app_id,
+    str_rate_precision,
+    str_platform_fee_bps,
+    str_noderunner_fee_bps,
+    str_upgrade_period,
+    str_fee_update_period,
+    str_fee_update_max_delta,
+    str_max_balance,
+    str_delay_optin,
+    str_swap_keeper_bps,
+]
+
+# the per-key config globals of contracts created before the packed config, see admin.migrate_config
+legacy_config_fields = config_fields[:11]
+
+# tunables map:
+
+# 0:  [8 bytes] asa_claim_mode uint64
+# 8:  [8 bytes] compact_events uint64
+# 16: [8 bytes] opup_max_fees uint64
+# 24: [8 bytes] swap_min_surplus uint64
+# 32: [8 bytes] swap_min_rounds uint64
+# 40: [8 bytes] swap_max_slippage_bps uint64
+# 48: [8 bytes] swap_max_chunk_bps uint64
+
+tunable_fields = [
+    str_asa_claim_mode,
+    str_compact_events,
+    str_opup_max_fees,
+    str_swap_min_surplus,
+    str_swap_min_rounds,
+    str_swap_max_slippage_bps,
+    str_swap_max_chunk_bps,
+]
+
+
+def _packed_len(key_len, fields):
+    """
+    packed value length of $fields; fails the build if key + value go over the 128 byte global limit
+    """
+    assert key_len + 8 * len(fields) <= 128, "packed global over 128 bytes; move fields to another global"
+    return Int(8 * len(fields))
+
+
+# key lengths: "cfg", "tun"
+config_len = _packed_len(3, config_fields)
+tunables_len = _packed_len(3, tunable_fields)
+
+# pyteal expressions are not hashable; key by identity of the str_* constants
+packed_fields = {
+    id(key): (packed, Int(8 * idx))
+    for packed, fields in ((str_config, config_fields), (str_tunables, tunable_fields))
+    for idx, key in enumerate(fields)
+}
+
+
+def is_packed_field(key):
+    return id(key) in packed_fields
+
+
+def config_empty():
+    """
+    zeroed config record, used on creation
+    """
+    return BytesZero(config_len)
+
+
+def tunables_empty():
+    """
+    zeroed tunables record: every switch off and every policy at its default
+    """
+    return BytesZero(tunables_len)
+
+
+def config_pack(values):
+    """
+    packed config record from a list of (str_* key, uint64 value) pairs. every config field must be given
+    """
+    by_key = {id(key): value for key, value in values}
+    if set(by_key) != {id(key) for key in config_fields}:
+        raise ValueError("config_pack requires exactly one value per config field")
+    return Concat(*[Itob(by_key[id(key)]) for key in config_fields])
+
+
+def tunable_index(key):
+    """
+    set_config() field index of tunable $key
+    """
+    return next(idx for idx, field in enumerate(tunable_fields) if field is key)
+
+
+def tunables_set(offset, value):
+    """
+    write $value at byte $offset of the packed tunables. $offset may be computed at runtime, see admin.set_config
+    """
+    return App.globalPut(str_tunables, Replace(App.globalGet(str_tunables), offset, Itob(value)))
 
 
 def gget(key):
     """
     global get
     """
+    if is_packed_field(key):
+        packed, offset = packed_fields[id(key)]
+        return ExtractUint64(App.globalGet(packed), offset)
     return App.globalGet(key)
 
 
@@ -12,6 +177,9 @@ def gset(key, value):
     """
     global set
     """
+    if is_packed_field(key):
+        packed, offset = packed_fields[id(key)]
+        return App.globalPut(packed, Replace(App.globalGet(packed), offset, Itob(value)))
     return App.globalPut(key, value)
 
 
@@ -19,11 +187,86 @@ def global_decr(key, val):
     """
     decrement numeric global state var
     """
-    return App.globalPut(key, App.globalGet(key) - val)
+    return gset(key, gget(key) - val)
 
 
 def global_incr(key, val):
     """
     increment numeric global state var
     """
-    return App.globalPut(key, val + App.globalGet(key))
+    return gset(key, val + gget(key))
+
+
+## Per-call scratch cache for hot uint64 globals
+#
+# cache_load() copies every cached key into its own scratch slot at the start of an app call
+# cget() then serves reads with a single scratch load instead of a keyed app_global_get
+# cset/cached_incr/cached_decr write through to scratch and global state
+#
+# WARNING cget() returns zero for a key until cache_load() has run in the current app call.
+# pre_mint_or_redeem() loads the cache before anything else, so anything downstream of it is safe.
+# Writes to cached keys must go through cset/cached_incr/cached_decr, otherwise the cache goes stale.
+
+cached_keys = [
+    str_staked,
+    str_asa_id,
+    str_delay_optin,
+    str_platform_fees,
+    str_noderunner_fees,
+    str_platform_fee_bps,
+    str_noderunner_fee_bps,
+    str_rate_precision,
+]
+
+# fixed slots 240+, read across subroutines
+# pyteal expressions are not hashable; key the slots by identity of the str_* constants
+cache_slots = {
+    id(key): ScratchVar(TealType.uint64, 240 + idx) for idx, key in enumerate(cached_keys)
+}
+
+
+def _cache_slot(key):
+    if id(key) not in cache_slots:
+        raise KeyError("global key is not cached; add it to cached_keys or use gget")
+    return cache_slots[id(key)]
+
+
+@Subroutine(TealType.none)
+def cache_load():
+    """
+    load cached globals into scratch. Call once at the start of an app call path;
+    reloading is harmless as writes go through to global state
+    """
+    return Seq(*[cache_slots[id(key)].store(gget(key)) for key in cached_keys])
+
+
+def cget(key):
+    """
+    cached global get
+    """
+    return _cache_slot(key).load()
+
+
+def cset(key, value):
+    """
+    cached global set; writes through to global state
+    """
+    slot = _cache_slot(key)
+    return Seq(
+        slot.store(value),
+        gset(key, slot.load()),
+    )
+
+
+def cached_decr(key, val):
+    """
+    decrement cached numeric global state var
+    """
+    return cset(key, cget(key) - val)
+
+
+def cached_incr(key, val):
+    """
+    increment cached numeric global state var
+    """
+    return cset(key, val + cget(key))
@@ -6,6 +6,8 @@ byte_one=Bytes('base16', '01')
 bytes_numbers=Bytes("0123456789")
 
 str_version=Bytes('v')
+str_config=Bytes('cfg')
+str_tunables=Bytes('tun')
 
 str_asa_id=Bytes('asa_id')
 str_lst_id=Bytes('lst_id')
@@ -30,10 +32,27 @@ str_contract_upgrade=Bytes('contract_upgrade')
 str_protest_count=Bytes('protest_cnt')
 str_protest_sum=Bytes('protest_sum')
 
+str_swap_check_round=Bytes('swap_chk_rnd')
+str_last_swap_round=Bytes('last_swap_rnd')
+
 str_upgrade_period=Bytes('upgrade_period')
 str_fee_update_period=Bytes('fee_update_period')
 str_fee_update_max_delta=Bytes('fee_update_max_delta')
 str_max_balance=Bytes('max_balance')
 str_rate_precision=Bytes('rate_precision')
 str_tm2_app_id=Bytes('tm2_app_id')
-str_arc59_app_id=Bytes('arc59_app_id')
\ No newline at end of file
+str_arc59_app_id=Bytes('arc59_app_id')
+str_asa_claim_mode=Bytes('asa_claim_mode')
+str_compact_events=Bytes('compact_events')
+str_opup_max_fees=Bytes('opup_max_fees')
+str_swap_min_surplus=Bytes('swap_min_surplus')
+str_swap_min_rounds=Bytes('swap_min_rounds')
+str_swap_max_slippage_bps=Bytes('swap_max_slip')
+str_swap_max_chunk_bps=Bytes('swap_max_chunk')
+str_swap_keeper_bps=Bytes('swap_keeper_bps')
+
+str_swap_ref_price=Bytes('swap_ref_price')
+str_swap_ref_round=Bytes('swap_ref_rnd')
+str_swap_pending=Bytes('swap_pending')
+
+str_asa_claims=Bytes('asa_claims')
\ No newline at end of file
@@ -4,14 +4,11 @@ from pyteal import (
     Bytes,
     Global,
     If,
-    InnerTxnBuilder,
     Int,
     Itob,
     Log,
     OnComplete,
-    ScratchVar,
     Seq,
-    TealType,
     TxnField,
     TxnType,
     WideRatio,
@@ -20,29 +17,22 @@ from lib.err import err_lp
 from lib.events import emit_event
 from lib.storage import gget
 from lib.str import str_asa_id, str_lp_id, str_tm2_app_id
-from lib.utils import custom_assert, get_asset_balance
+from lib.utils import custom_assert, get_asset_balance, itxn_group, payment_fields
 
 
-def swap_tm2_algo_asa(swap_amt):
-    price = ScratchVar(TealType.uint64)
+def swap_tm2_algo_asa(swap_amt, asa_amt):
+    """
+    swap $swap_amt ALGO for at least $asa_amt ASA (see get_price). Returns 0 without swapping if $asa_amt is zero
+    """
     return Seq(
-        price.store(get_price(gget(str_lp_id), swap_amt)),
-        If(price.load() == Int(0))
+        If(asa_amt == Int(0))
         .Then(
             Int(0),
         )
         .Else(
-            InnerTxnBuilder.Begin(),
-            InnerTxnBuilder.SetFields(
-                {
-                    TxnField.type_enum: TxnType.Payment,
-                    TxnField.receiver: gget(str_lp_id),
-                    TxnField.amount: swap_amt,
-                    TxnField.fee: Global.min_txn_fee(),
-                }
-            ),
-            InnerTxnBuilder.Next(),
-            InnerTxnBuilder.SetFields(
+            # payment and swap call in one inner group, fees pooled on the payment
+            itxn_group(
+                payment_fields(gget(str_lp_id), swap_amt, Int(3) * Global.min_txn_fee()),
                 {
                     TxnField.type_enum: TxnType.ApplicationCall,
                     TxnField.on_completion: OnComplete.NoOp,
@@ -50,18 +40,17 @@ def swap_tm2_algo_asa(swap_amt):
                     TxnField.application_args: [
                         Bytes("swap"),
                         Bytes("fixed-input"),
-                        Itob(price.load()),
+                        Itob(asa_amt),
                     ],
                     TxnField.assets: [gget(str_asa_id)],
                     TxnField.accounts: [gget(str_lp_id)],
-                    TxnField.fee: Int(2) * Global.min_txn_fee(),
-                }
+                    TxnField.fee: Int(0),
+                },
             ),
-            InnerTxnBuilder.Submit(),
             emit_event(
                 "swap(uint64,uint64)",  # arc28: algo_amount, asa_amount
                 Itob(swap_amt),
-                Itob(price.load()),
+                Itob(asa_amt),
             ),
             emit_event(
                 "asa_balance(uint64)",  # arc28: asa_balance
@@ -116,3 +105,22 @@ def get_price(tm_account, amount):
 
 def get_tm2_net_amt(amt):
     return amt - (Int(30) * amt / Int(10000))
+
+
+def get_tm2_algo_reserves(tm_account):
+    """
+    Tinyman v2 pool ALGO reserves
+    """
+    asset1_id = App.localGetEx(tm_account, gget(str_tm2_app_id), Bytes("asset_1_id"))
+    asset1_reserves = App.localGetEx(tm_account, gget(str_tm2_app_id), Bytes("asset_1_reserves"))
+    asset2_reserves = App.localGetEx(tm_account, gget(str_tm2_app_id), Bytes("asset_2_reserves"))
+    return Seq(
+        asset1_id,
+        asset1_reserves,
+        asset2_reserves,
+        custom_assert(asset1_id.hasValue(), err_lp),
+        If(asset1_id.value() == Int(0))
+        .Then(asset1_reserves.value())
+        .Else(asset2_reserves.value()),
+    )
+
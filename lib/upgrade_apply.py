@@ -5,6 +5,7 @@ from pyteal import (
     Int,
     Itob,
     Len,
+    Pop,
     ScratchVar,
     Seq,
     Sha512_256,
@@ -14,6 +15,7 @@ from pyteal import (
 )
 from lib.decorators import admin_or_fee_admin_only
 from lib.events import emit_event
+from lib.opup import ensure_budget, page_hash_min_budget
 from lib.storage import gget, gset
 from lib.str import bytes_empty, str_contract_upgrade, str_protest_sum
 from lib.utils import custom_assert, get_upgrade_maturity_ts
@@ -50,6 +52,8 @@ def process_upgrade():
             pg_idx.load() < Txn.approval_program_pages.length(),
             pg_idx.store(pg_idx.load() + Int(1)),
         ).Do(
+            # OpUp calls draw on the caller's pooled fee
+            Pop(ensure_budget(page_hash_min_budget, Int(0))),
             # Store the expected hash in scratch to compare
             expected_hash.store(
                 Extract(expected_page_hashes.load(), Int(32) * pg_idx.load(), Int(32))
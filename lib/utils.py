@@ -13,7 +13,6 @@ from pyteal import (
     Int,
     Itob,
     Log,
-    Not,
     OnComplete,
     Seq,
     Subroutine,
@@ -21,19 +20,26 @@ from pyteal import (
     TxnField,
     TxnType,
 )
+from lib.err import err_codes
 from lib.storage import gget
 from lib.str import bytes_numbers, str_contract_upgrade, str_lst_id
 
 
-# assert that fails with an error string attached
+@Subroutine(TealType.none)
+def log_error(code):
+    """
+    logs "ERR " + one byte error code. See lib/err.py err_codes
+    """
+    return Log(Concat(Bytes("ERR "), Extract(Itob(code), Int(7), Int(1))))
+
+
+# assert that fails with an error code attached
 def custom_assert(cond, str):
     """
     assert with custom error message
     """
-    return If(Not(cond)).Then(
-        Log(Bytes(str)),
-        Err(),
-    )
+    # the check stays inline and the failure is jumped over: a passing assert costs the condition and one bnz
+    return If(cond).Then(Seq()).Else(fail(str))
 
 # same as above, but inversed - skips a Not()
 # not sure if it saves opcode costs
@@ -41,10 +47,7 @@ def fail_if(cond, str):
     """
     inverted assert with custom error message
     """
-    return If(cond).Then(
-        Log(Bytes(str)),
-        Err()
-    )
+    return If(cond).Then(fail(str))
 
 
 # as above but without condition
@@ -52,9 +55,17 @@ def fail(str):
     """
     fail with custom error message
     """
+    return fail_code(Int(err_codes[str]))
+
+
+def fail_code(code):
+    """
+    fail with error code $code, which may be computed at runtime. See lib/err.py err_codes
+    """
+    # Err() stays inline so the failing branch needs no jump back
     return Seq(
-        Log(Bytes(str)),
-        Err()
+        log_error(code),
+        Err(),
     )
 
 
@@ -137,6 +148,42 @@ def send_algo(receiver, amount, fee):
     )
 
 
+## Grouped inner transactions
+#
+# itxn_group() submits several inner txns as one inner group with a single itxn_begin/itxn_submit,
+# instead of one Execute per txn. Steps are field dicts or field-setting expressions such as
+# InnerTxnBuilder.MethodCall. Fees can be pooled: set the group's total on one txn and 0 on the rest
+
+
+def payment_fields(receiver, amount, fee):
+    return {
+        TxnField.type_enum: TxnType.Payment,
+        TxnField.receiver: receiver,
+        TxnField.amount: amount,
+        TxnField.fee: fee,
+    }
+
+
+def axfer_fields(receiver, aid, amount, fee):
+    return {
+        TxnField.type_enum: TxnType.AssetTransfer,
+        TxnField.xfer_asset: aid,
+        TxnField.asset_receiver: receiver,
+        TxnField.asset_amount: amount,
+        TxnField.fee: fee,
+    }
+
+
+def itxn_group(*steps):
+    ops = [InnerTxnBuilder.Begin()]
+    for idx, step in enumerate(steps):
+        if idx > 0:
+            ops.append(InnerTxnBuilder.Next())
+        ops.append(InnerTxnBuilder.SetFields(step) if isinstance(step, dict) else step)
+    ops.append(InnerTxnBuilder.Submit())
+    return Seq(*ops)
+
+
 def closeout_algo(receiver):
     return InnerTxnBuilder.Execute(
         {
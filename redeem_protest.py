@@ -1,14 +1,19 @@
 from pyteal import (
     App,
     Btoi,
+    Bytes,
+    Concat,
+    ExtractUint64,
     Global,
     If,
     Int,
     Itob,
+    Len,
     Pop,
     ScratchVar,
     Seq,
     Subroutine,
+    Suffix,
     TealType,
     Txn,
     WideRatio,
@@ -25,9 +30,9 @@ from lib.err import (
     err_min_protest,
     err_no_protest,
 )
-from lib.events import emit_event
-from lib.rate import _get_rate, pre_mint_or_redeem
-from lib.storage import gget, global_decr, global_incr
+from lib.events import emit_compact_or_verbose, emit_event
+from lib.rate import _get_rate, invalidate_swap_check, pre_mint_or_redeem
+from lib.storage import cached_decr, cget, gget, global_decr, global_incr
 from lib.str import (
     bytes_empty,
     byte_zero,
@@ -40,7 +45,13 @@ from lib.str import (
     str_rate_precision,
     str_staked,
 )
-from lib.utils import custom_assert, get_asset_balance, get_upgrade_maturity_ts, send_algo, send_asa
+from lib.utils import (
+    custom_assert,
+    get_asset_balance,
+    get_upgrade_maturity_ts,
+    send_algo,
+    send_asa,
+)
 from lib.validate import validate_asa_payment_before
 from router import router
 
@@ -51,8 +62,10 @@ def protest_stake():
     public method. locks dualSTAKE LST stake on the contract as "upgrade protest".
     This blocks upgrading unless it is dissolved (redeemed & returned to user)
     The upgrade can also be cancelled, whereafter the dualSTAKE tokens can be returned to the user unchanged
+    Box references: the caller's address, and for new protests the protester index page (see add_protester)
     """
     amount = ScratchVar(TealType.uint64)
+    stake = ScratchVar(TealType.uint64)
     return Seq(
         # reject if there is no upgrade proposed
         custom_assert(gget(str_contract_upgrade) != bytes_empty, err_no_upgrade),
@@ -62,22 +75,18 @@ def protest_stake():
         custom_assert(
             amount.load() >= Int(1000000), err_min_protest # 1 ALGO equivalent minimum. to cover arc59 fees if necessary 
         ),
-        If(is_user_protesting(Txn.sender()))
+        stake.store(get_user_protesting_stake_or_zero(Txn.sender())),
+        If(stake.load() > Int(0))
         .Then(
             # increase existing protesting stake
-            set_user_protesting_stake(
-                Txn.sender(), get_user_protesting_stake(Txn.sender()) + amount.load()
-            ),
+            set_user_protesting_stake(Txn.sender(), stake.load() + amount.load()),
         )
         .Else(
             # new protest
-            # increase the number of protesting accounts by one
-            global_incr(str_protest_count, Int(1)),
-            # set protesting stake on box
-            set_user_protesting_stake(
-                Txn.sender(),
-                amount.load(),
-            ),
+            # set protesting stake on box, add to index, increase the number of protesting accounts by one
+            add_protester(Txn.sender(), amount.load()),
+            # box MBR changes the escrow surplus
+            invalidate_swap_check(),
         ),
         emit_event(
             "protest(uint64)",  # arc28: lst_amount
@@ -161,10 +170,11 @@ def internal_unprotest_adjust_state(user, amount):
     """
     return Seq(
         # adjust global
-        global_decr(str_protest_count, Int(1)),
         global_decr(str_protest_sum, amount),
-        # delete user protest box
-        custom_assert(App.box_delete(user), err_box_del),
+        # remove user protest record, decrease the number of protesting accounts by one
+        remove_protester(user),
+        # box MBR changes the escrow surplus
+        invalidate_swap_check(),
     )
 
 
@@ -178,19 +188,15 @@ def internal_redeem(user, amount, fees):
     return Seq(
         custom_assert(amount, err_zero),
         rate.store(_get_rate()),
-        emit_event(
-            "rate(uint64)",  # arc28: rate
-            Itob(rate.load()),
-        ),
         If(rate.load() > Int(0))
         .Then(
             asa_amount.store(
-                WideRatio([amount, rate.load()], [gget(str_rate_precision)])
+                WideRatio([amount, rate.load()], [cget(str_rate_precision)])
             ),
             send_algo_and_asa(
                 user,
                 amount,
-                gget(str_asa_id),
+                cget(str_asa_id),
                 asa_amount.load(),
                 fees,
             ),
@@ -199,32 +205,166 @@ def internal_redeem(user, amount, fees):
             asa_amount.store(Int(0)),
                 send_algo(user, amount - fees, fees),
         ),
-        emit_event(
-            "redeem(uint64,uint64)",  # arc28: algo_amount, asa_amount
-            Itob(amount),
-            Itob(asa_amount.load()),
-        ),
-        emit_event(
-            "asa_balance(uint64)",  # arc28: asa_balance
-            Itob(get_asset_balance(gget(str_asa_id))),
+        emit_compact_or_verbose(
+            emit_event(
+                "redeem_v2(uint64,uint64,uint64,uint64)",  # arc28: rate, algo_amount, asa_amount, asa_balance
+                Itob(rate.load()),
+                Itob(amount),
+                Itob(asa_amount.load()),
+                Itob(get_asset_balance(cget(str_asa_id))),
+            ),
+            emit_event(
+                "rate(uint64)",  # arc28: rate
+                Itob(rate.load()),
+            ),
+            emit_event(
+                "redeem(uint64,uint64)",  # arc28: algo_amount, asa_amount
+                Itob(amount),
+                Itob(asa_amount.load()),
+            ),
+            emit_event(
+                "asa_balance(uint64)",  # arc28: asa_balance
+                Itob(get_asset_balance(cget(str_asa_id))),
+            ),
         ),
         # mark removed algo stake
-        global_decr(str_staked, amount),
+        cached_decr(str_staked, amount),
+    )
+
+
+## Protest storage
+#
+# One box per protester, named by its address. Lookups and stake updates touch only that box
+#
+# user protest box map:
+
+# 0:  [8 bytes] protesting stake uint64
+# 8:  [8 bytes] protester index position uint64
+
+user_stake_offset = Int(0)
+user_index_pos_offset = Int(8)
+
+## Protester index
+#
+# Dense list of protesting addresses over page boxes, so protesters can be enumerated on chain
+# page box name: "pi" + uint64 page number. protester #i lives in page i / 31 at byte (i % 31) * 32.
+# protest_cnt is the list length, so all of them are listed by list_protesters() pages 0 to (protest_cnt - 1) / 31
+# 31 addresses per page keep a page's address[] return value (4 + 2 + 31 * 32 bytes) under the 1024 byte log limit
+# Pages grow/shrink by one address on insert/delete, so the last page only holds MBR for its entries.
+# Removal moves the last protester into the gap. Pages are deleted when they empty out
+#
+# MBR per protester: user box 2500 + 400 * (32 + 16) = 21700, index entry 400 * 32 = 12800,
+# plus the 2500 + 400 * 10 = 6500 page base shared by up to 31 protesters:
+# 41000 for the first protester of a page, about 34700 each on full pages
+
+protester_index_page_prefix = Bytes("pi")
+protesters_per_page = Int(31)
+
+
+def protester_index_page(pos):
+    """
+    Returns box name of the index page holding position $pos
+    """
+    return Concat(protester_index_page_prefix, Itob(pos / protesters_per_page))
+
+
+def protester_index_offset(pos):
+    """
+    Returns byte offset of position $pos in its index page
+    """
+    return (pos % protesters_per_page) * Int(32)
+
+
+def add_protester(user, stake):
+    """
+    Creates the user protest box and appends the user to the protester index
+    Box references: user, index page of position protest_cnt
+    """
+    pos = ScratchVar(TealType.uint64)
+    return Seq(
+        pos.store(gget(str_protest_count)),
+        # first position of a page: create it, else grow it by one address
+        If(protester_index_offset(pos.load()) == Int(0))
+        .Then(Pop(App.box_create(protester_index_page(pos.load()), Int(32))))
+        .Else(App.box_resize(protester_index_page(pos.load()), protester_index_offset(pos.load()) + Int(32))),
+        App.box_replace(protester_index_page(pos.load()), protester_index_offset(pos.load()), user),
+        App.box_put(user, Concat(Itob(stake), Itob(pos.load()))),
+        global_incr(str_protest_count, Int(1)),
+    )
+
+
+def remove_protester(user):
+    """
+    Deletes the user protest box and removes the user from the protester index
+    Box references: user, index page of the user and of the last position, the last protester
+    """
+    pos = ScratchVar(TealType.uint64)
+    last = ScratchVar(TealType.uint64)
+    moved = ScratchVar(TealType.bytes)
+    return Seq(
+        pos.store(Btoi(App.box_extract(user, user_index_pos_offset, Int(8)))),
+        last.store(gget(str_protest_count) - Int(1)),
+        # move the last protester into the gap
+        If(pos.load() != last.load()).Then(
+            moved.store(
+                App.box_extract(protester_index_page(last.load()), protester_index_offset(last.load()), Int(32))
+            ),
+            App.box_replace(protester_index_page(pos.load()), protester_index_offset(pos.load()), moved.load()),
+            App.box_replace(moved.load(), user_index_pos_offset, Itob(pos.load())),
+        ),
+        # shrink the last page by one address, delete it once empty
+        If(protester_index_offset(last.load()) == Int(0))
+        .Then(custom_assert(App.box_delete(protester_index_page(last.load())), err_box_del))
+        .Else(App.box_resize(protester_index_page(last.load()), protester_index_offset(last.load()))),
+        # delete user protest box
+        custom_assert(App.box_delete(user), err_box_del),
+        global_decr(str_protest_count, Int(1)),
+    )
+
+
+@router.method
+def list_protesters(page: abi.Uint64, *, output: abi.DynamicArray[abi.Address]):
+    """
+    public read-only method. Returns the protesting addresses on index page $page, up to 31.
+    Pages run from 0 to (protest_cnt - 1) / 31; pages past the last return an empty list
+    Box references: the index page
+    """
+    page_box = Concat(protester_index_page_prefix, Itob(page.get()))
+    return Seq(
+        addresses := App.box_get(page_box),
+        # address[] encoding: uint16 length prefix + packed addresses
+        output.decode(
+            If(addresses.hasValue())
+            .Then(Concat(Suffix(Itob(Len(addresses.value()) / Int(32)), Int(6)), addresses.value()))
+            .Else(Bytes("base16", "0000"))
+        ),
     )
 
 
 @Subroutine(TealType.uint64)
 def get_user_protesting_stake(user):
+    stake = ScratchVar(TealType.uint64)
+    return Seq(
+        stake.store(get_user_protesting_stake_or_zero(user)),
+        custom_assert(stake.load() > Int(0), err_no_protest),
+        stake.load(),
+    )
+
+
+@Subroutine(TealType.uint64)
+def get_user_protesting_stake_or_zero(user):
+    """
+    Returns protesting stake of $user, or zero if not protesting. Protesting stake is never zero, see err_min_protest
+    """
     return Seq(
         box := App.box_get(user),
-        custom_assert(box.hasValue(), err_no_protest),
-        Btoi(box.value()),
+        If(box.hasValue()).Then(ExtractUint64(box.value(), user_stake_offset)).Else(Int(0)),
     )
 
+
 # Following functions are too small to bother doing as subroutines
 def set_user_protesting_stake(user, stake):
-    return App.box_put(user, Itob(stake))
-
-
-def is_user_protesting(user):
-    return Seq(box := App.box_length(user), box.hasValue())
+    """
+    Updates the stake of an existing protester
+    """
+    return App.box_replace(user, user_stake_offset, Itob(stake))
@@ -22,30 +22,39 @@ from admin import (
     change_feeaddr,
     change_noderunner,
     configure,
+    set_config,
 )
+from claim import claim_asa
 from fee_update import maybe_apply_fee_update, queue_update_fees, reset_update_fees
 from fees import withdraw_node_runner_fees, withdraw_platform_fees
 from keyreg import keyreg_offline, keyreg_online
 from lib.decorators import ready
-from lib.events import emit_event
+from lib.events import emit_compact_or_verbose, emit_event
 from lib.err import err_max_stake_exceeded, err_asa_rate, err_no_swap, err_swap_fail
 from lib.rate import (
     _get_rate,
+    get_actual_expected_balance_delta,
     get_asset_balance,
+    get_paired_asa_balance,
+    get_swap_min_surplus,
     maybe_optin,
     need_swap,
     pre_mint_or_redeem,
     swap,
 )
-from lib.storage import gget, global_incr
+from lib.storage import cache_load, cached_incr, cget, gget
 from lib.str import (
     bytes_empty,
     str_asa_id,
     str_contract_upgrade,
+    str_last_swap_round,
     str_lst_id,
     str_max_balance,
     str_rate_precision,
     str_staked,
+    str_swap_keeper_bps,
+    str_swap_min_rounds,
+    str_swap_pending,
 )
 from lib.utils import custom_assert, send_asa
 from lib.validate import (
@@ -59,8 +68,7 @@ from redeem_protest import (
     internal_redeem,
     protest_stake,
     unprotest_stake,
-    is_user_protesting,
-    get_user_protesting_stake,
+    get_user_protesting_stake_or_zero,
 )
 from router import router
 from upgrade import queue_upgrade, reset_upgrade
@@ -83,6 +91,8 @@ queue_upgrade
 reset_upgrade
 keyreg_offline
 keyreg_online
+set_config
+claim_asa
 
 
 @router.method
@@ -111,16 +121,12 @@ def mint():
             err_max_stake_exceeded,
         ),
         rate.store(_get_rate()),
-        emit_event(
-            "rate(uint64)",  # arc28: rate
-            Itob(rate.load()),
-        ),
         If(rate.load() > Int(0))
         .Then(
             asa_amount_required.store(
                 WideRatio(
                     [amount.load(), rate.load()],
-                    [gget(str_rate_precision)],
+                    [cget(str_rate_precision)],
                 )
             ),
             # WARNING Intentionally using after-positioning for the asa payment
@@ -128,7 +134,7 @@ def mint():
             # If this changes then we introduced a vulnerability
             # As the ASA payment could double for this call and the future call that validates at position-1
             asa_amount_received.store(
-                validate_asa_payment_after(asa_txn_offset, gget(str_asa_id))
+                validate_asa_payment_after(asa_txn_offset, cget(str_asa_id))
             ),
             custom_assert(
                 asa_amount_required.load() <= asa_amount_received.load(),
@@ -139,17 +145,31 @@ def mint():
             asa_amount_received.store(Int(0)),
             asa_amount_required.store(Int(0)),
         ),
-        emit_event(
-            "mint(uint64,uint64,uint64)",  # arc28: algo_amount, asa_amount_required, asa_amount_received
-            Itob(amount.load()),
-            Itob(asa_amount_required.load()),
-            Itob(asa_amount_received.load()),
-        ),
-        emit_event(
-            "asa_balance(uint64)",  # arc28: asa_balance
-            Itob(get_asset_balance(gget(str_asa_id)) + asa_amount_received.load()),
+        emit_compact_or_verbose(
+            emit_event(
+                "mint_v2(uint64,uint64,uint64,uint64,uint64)",  # arc28: rate, algo_amount, asa_amount_required, asa_amount_received, asa_balance
+                Itob(rate.load()),
+                Itob(amount.load()),
+                Itob(asa_amount_required.load()),
+                Itob(asa_amount_received.load()),
+                Itob(get_asset_balance(cget(str_asa_id)) + asa_amount_received.load()),
+            ),
+            emit_event(
+                "rate(uint64)",  # arc28: rate
+                Itob(rate.load()),
+            ),
+            emit_event(
+                "mint(uint64,uint64,uint64)",  # arc28: algo_amount, asa_amount_required, asa_amount_received
+                Itob(amount.load()),
+                Itob(asa_amount_required.load()),
+                Itob(asa_amount_received.load()),
+            ),
+            emit_event(
+                "asa_balance(uint64)",  # arc28: asa_balance
+                Itob(get_asset_balance(cget(str_asa_id)) + asa_amount_received.load()),
+            ),
         ),
-        global_incr(str_staked, amount.load()),
+        cached_incr(str_staked, amount.load()),
         send_asa(Txn.sender(), gget(str_lst_id), amount.load(), Int(0)),
     )
 
@@ -212,6 +232,11 @@ class ContractListing(abi.NamedTuple):
 
     user_protesting_stake: abi.Field[abi.Uint64]
 
+    swap_min_surplus: abi.Field[abi.Uint64]
+    swap_min_rounds: abi.Field[abi.Uint64]
+    last_swap_round: abi.Field[abi.Uint64]
+    swap_pending: abi.Field[abi.Uint64]
+
 
 @router.method
 @ready
@@ -220,7 +245,7 @@ def get_contract_listing(user: abi.Address, *, output: ContractListing):
     Public method. Returns ABI struct ContractListing:
         rate (see get_rate)
         escrow algo balance
-        escrow asa balance
+        escrow asa balance, minus ASA owed to claimants
         staked balance
         dualstake token ID
         dualstake asset name
@@ -232,6 +257,8 @@ def get_contract_listing(user: abi.Address, *, output: ContractListing):
         incentive_eligible
         is_online
         user_protesting_stake
+        swap policy: swap_min_surplus (effective), swap_min_rounds, last_swap_round
+        swap_pending: ALGO carried over from chunked swaps
     will swap and apply fee updates if needed
     """
     rate = abi.Uint64()
@@ -267,15 +294,22 @@ def get_contract_listing(user: abi.Address, *, output: ContractListing):
 
     upgrading = abi.Bool()
     user_protesting_stake = abi.Uint64()
+    swap_min_surplus = abi.Uint64()
+    swap_min_rounds = abi.Uint64()
+    last_swap_round = abi.Uint64()
+    swap_pending = abi.Uint64()
     return Seq(
+        algo_balance.set(Balance(Global.current_application_address())),
+        will_swap.set(pre_mint_or_redeem()),
+        rate.set(_get_rate()),
+        # after pre_mint_or_redeem: get_paired_asa_balance reads asa_id from the per-call cache
+        asa_balance.set(get_paired_asa_balance()),
         lst_asset_param_name,
         asa_asset_param_name,
         asa_asset_param_unit_name,
         asa_asset_decimal_param,
         acct_param_eligible,
         voter_param_eligible,
-        algo_balance.set(Balance(Global.current_application_address())),
-        asa_balance.set(get_asset_balance(gget(str_asa_id))),
         staked.set(gget(str_staked)),
         dualstake_id.set(gget(str_lst_id)),
         dualstake_name.set(lst_asset_param_name.value()),
@@ -283,16 +317,14 @@ def get_contract_listing(user: abi.Address, *, output: ContractListing):
         asa_name.set(asa_asset_param_name.value()),
         asa_unit_name.set(asa_asset_param_unit_name.value()),
         asa_decimals.set(asa_asset_decimal_param.value()),
-        will_swap.set(pre_mint_or_redeem()),
-        rate.set(_get_rate()),
         ie.set(acct_param_eligible.value()),
         is_online.set(voter_param_eligible.hasValue()),
         upgrading.set(gget(str_contract_upgrade) != bytes_empty),
-        user_protesting_stake.set(
-            If(is_user_protesting(user.get()))
-            .Then(get_user_protesting_stake(user.get()))
-            .Else(Int(0))
-        ),
+        user_protesting_stake.set(get_user_protesting_stake_or_zero(user.get())),
+        swap_min_surplus.set(get_swap_min_surplus()),
+        swap_min_rounds.set(gget(str_swap_min_rounds)),
+        last_swap_round.set(gget(str_last_swap_round)),
+        swap_pending.set(gget(str_swap_pending)),
         output.set(
             rate,
             algo_balance,
@@ -309,6 +341,10 @@ def get_contract_listing(user: abi.Address, *, output: ContractListing):
             is_online,
             upgrading,
             user_protesting_stake,
+            swap_min_surplus,
+            swap_min_rounds,
+            last_swap_round,
+            swap_pending,
         ),
     )
 
@@ -326,7 +362,7 @@ def get_rate_and_balances(*, output: StateResult):
     Public method. Returns ABI tuple[3]:
         rate (see get_rate)
         escrow algo balance
-        escrow asa balance
+        escrow asa balance, minus ASA owed to claimants
     will swap and apply fee updates if needed
     """
     rate = abi.Uint64()
@@ -336,7 +372,7 @@ def get_rate_and_balances(*, output: StateResult):
         Pop(pre_mint_or_redeem()),
         rate.set(_get_rate()),
         algo_balance.set(Balance(Global.current_application_address())),
-        asa_balance.set(get_asset_balance(gget(str_asa_id))),
+        asa_balance.set(get_paired_asa_balance()),
         output.set(rate, algo_balance, asa_balance),
     )
 
@@ -347,7 +383,10 @@ def get_need_swap(*, output: abi.Bool):
     """
     Public method. Returns whether the contract thinks it needs to swap
     """
-    return Seq(output.set(need_swap()))
+    return Seq(
+        cache_load(),
+        output.set(need_swap(get_actual_expected_balance_delta())),
+    )
 
 
 @router.method
@@ -355,12 +394,17 @@ def get_need_swap(*, output: abi.Bool):
 def swap_or_fail():
     """
     Public method. Perform swap or fail
+    Pays the caller swap_keeper_bps of the swapped rewards, less the payout txn fee
     """
+    surplus = ScratchVar(TealType.uint64)
     return Seq(
+        cache_load(),
         maybe_apply_fee_update(),
         maybe_optin(),
-        custom_assert(need_swap(), err_no_swap),
-        custom_assert(swap(), err_swap_fail),
+        surplus.store(get_actual_expected_balance_delta()),
+        custom_assert(need_swap(surplus.load()), err_no_swap),
+        # keeper bounty for the caller, see queue_update_fees
+        custom_assert(swap(surplus.load(), gget(str_swap_keeper_bps)), err_swap_fail),
     )
 
 